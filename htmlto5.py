@@ -2,9 +2,85 @@
 import os
 import sys
 import re
+import hashlib
+import mmap
+import shutil
+import stat
+import tempfile
+import time
 
 VERSION = "1.7.9"  # don't save empty table style
 
+# Cache entries not used for this long are pruned when a new one is stored
+_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Precompiled patterns
+_RE_CSS_JUNK = re.compile(r'\s*(?:\/\/\s*-->|\/\*\s*XML\s+end\s*\]\]>\s*\*\/|\]\]>)\s*')
+_RE_ATTR = re.compile(r'\b(align|valign|width|height|border)=(["\'])(.*?)\2')
+_RE_ANY_VALUE = re.compile(r'.*')
+_RE_SIZE_VALUE = re.compile(r'\d+(?:\.\d+)?(?:%|em|px|rem|vw|vh)?')
+_RE_BORDER_VALUE = re.compile(r'\d+')
+_RE_TABLE_ATTR = re.compile(r'(\w+)=(["\'])(.*?)\2')
+_RE_CTRL = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]')
+_CTRL_TRANS = dict.fromkeys([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), *range(0x7F, 0xA0)])
+_RE_HTML_ATTRS = re.compile(r'\s+(xmlns|xml:lang|lang)="([^"]*)"')
+_RE_HTML_TAG = re.compile(r'<html[^>]*>', re.IGNORECASE)
+_RE_META_CHARSET = re.compile(
+    r'<meta[^>]+charset=[^>]*>|<meta\s+http-equiv=["\']Content-Type["\'][^>]*>',
+    re.IGNORECASE
+)
+_RE_XML_SPACE = re.compile(r'\s+xml:space=["\'][^"\']*["\']', re.IGNORECASE)
+_RE_TITLE = re.compile(
+    r'<title>\s*The Project Gutenberg eBook of (.+), by .+\s*</title>',
+    re.IGNORECASE
+)
+_RE_STYLE_TYPE = re.compile(r'<style\s+type\s*=\s*["\']text/css["\']\s*', re.IGNORECASE)
+_RE_STYLE_CDATA = re.compile(
+    r'(<style[^>]*>)\s*<!\[CDATA\[(.*?)\]\]>\s*(</style>)',
+    re.DOTALL | re.IGNORECASE
+)
+_RE_STYLE_CDATA_COMMENTED = re.compile(
+    r'(<style[^>]*>)\s*/\*<!\[CDATA\[\*/\s*(.*?)\s*/\*\]\]>\*/\s*(</style>)',
+    re.DOTALL | re.IGNORECASE
+)
+_RE_STYLE_BLOCK = re.compile(r'(<style[^>]*>)(.*?)(</style>)', re.DOTALL | re.IGNORECASE)
+_RE_TT_OPEN = re.compile(r'<tt([^>]*)>', re.IGNORECASE)
+_RE_BIG_OPEN = re.compile(r'<big([^>]*)>', re.IGNORECASE)
+_RE_CENTER_OPEN = re.compile(r'<center([^>]*)>', re.IGNORECASE)
+_RE_ANCHOR = re.compile(r'<a\b([^>]*)>', re.IGNORECASE)
+_RE_ANCHOR_ATTR = re.compile(r'\s+(id|name)\s*=\s*(["\']([^"\']*)["\'])', re.IGNORECASE)
+_RE_BLOCK_TAG = re.compile(r'(<(?:hr|table|td|th|div|p|h[1-6]))((?:\s+[^>]*)?)(\s*>)', re.IGNORECASE)
+_RE_TABLE_TAG = re.compile(r'(<table)((?:\s+[^>]*)?)(\s*>)', re.IGNORECASE)
+_RE_CELL_TAG = re.compile(r'(<(?:td|th))((?:\s+[^>]*)?)(\s*>)', re.IGNORECASE)
+_RE_IMG_TAG = re.compile(r'<img[^>]+>', re.IGNORECASE)
+_RE_SELF_CLOSING_SLASH = re.compile(r'\s*/\s*>')
+_RE_WHITESPACE = re.compile(r'\s+')
+# Every construct convert_to_html5 rewrites, matched in one pass.  The
+# leading lookahead lets the scan skip plain text quickly, so whitespace
+# before a removed meta tag or xml:space attribute is stripped by the caller.
+_TOKEN_PATTERN = (
+    r'(?=[</x])(?:'
+    r'(?P<xml_decl><\?xml[^>]*\?>[\r\n]*)'
+    r'|(?P<doctype><!doctype[^>]*>)'
+    r'|(?P<style_meta><meta[^>]*content-style-type[^>]*/?>\s*)'
+    r'|(?P<style><style[^>]*>(?s:.*?)</style>)'
+    r'|(?P<title><title>\s*the project gutenberg ebook of .+, by .+\s*</title>)'
+    r'|</(?P<close>tt|big|center)>'
+    # Tags whose conversions only rewrite attributes are matched only when
+    # they have some, so bare <p>, <td> etc. never leave the regex engine
+    r'|<(?P<tag>(?:html|head|meta|tt|big|center)\b|(?:a|hr|table|td|th|div|p|h[1-6]|img)(?=\s))[^>]*>'
+    r'|(?P<xml_space>xml:space=["\'][^"\']*["\'])'
+    r'|(?P<slash>/>)'
+    r')'
+)
+# Matched against a lowercased copy of the document, which avoids
+# case-folding every character during the scan
+_RE_TOKEN = re.compile(_TOKEN_PATTERN)
+# Used when lowercasing would change the length of the document.  re.ASCII
+# keeps Unicode case folding from matching tag names such as <bıg>, which
+# the lowercased scan never sees as tags.
+_RE_TOKEN_IGNORECASE = re.compile(_TOKEN_PATTERN, re.IGNORECASE | re.ASCII)
+
 def print_version():
     """Print version information."""
     print(f"HTML5 Converter version {VERSION}")
@@ -12,29 +88,74 @@ def print_version():
 
 def clean_css_comments(css_content):
     """Clean problematic comment syntax in CSS."""
-    css_content = re.sub(r'\s*\/\/\s*-->\s*', '', css_content)
-    css_content = re.sub(r'\s*\/\*\s*XML\s+end\s*\]\]>\s*\*\/\s*', '', css_content)
-    css_content = re.sub(r'\s*\]\]>\s*', '', css_content)
-    return css_content
+    # Strip "// -->", "/* XML end ]]>*/" and stray "]]>" in one pass
+    return _RE_CSS_JUNK.sub('', css_content)
 
 def merge_styles(old_style, new_styles):
     """Merge new CSS styles with existing style attribute."""
     if not new_styles:
         return old_style
 
-    if not old_style:
-        return '; '.join(s.strip() for s in new_styles.split(';') if s.strip()) + ';'
-
-    # Remove any quotes around the style content
-    old_style = old_style.strip('"\'')
-
-    # Split and clean both old and new styles
-    old_parts = [s.strip() for s in old_style.split(';') if s.strip()]
-    new_parts = [s.strip() for s in new_styles.split(';') if s.strip()]
-
-    # Combine and join with semicolons
-    all_parts = old_parts + new_parts
-    return '; '.join(all_parts) + ';'
+    # Split and clean both old and new styles in a single pass, then
+    # join the non-empty parts with semicolons
+    parts = map(str.strip, (old_style + ';' + new_styles).split(';'))
+    return '; '.join(filter(None, parts)) + ';'
+
+def find_style(attrs):
+    """Find the first quoted style attribute in attrs.
+
+    Returns its start and end offsets and its value, or None.  Plain
+    string searches are cheaper than a regex for attribute strings this
+    short.  Like the style=(["'])(.*?)\1 pattern they replace, a value
+    can't span lines.
+    """
+    start = attrs.find('style=')
+    while start >= 0:
+        quote = attrs[start + 6:start + 7]
+        if quote == '"' or quote == "'":
+            end = attrs.find(quote, start + 7)
+            if end >= 0 and '\n' not in attrs[start + 7:end]:
+                return start, end + 1, attrs[start + 7:end]
+        start = attrs.find('style=', start + 1)
+    return None
+
+def extract_attrs(attrs, value_patterns):
+    """Remove presentational attributes from attrs in a single scan.
+
+    value_patterns maps each attribute to remove to the pattern its value
+    must match.  Returns the first value found for each of them, the value
+    of the existing style attribute (None if there is none) and the
+    remaining attributes before and after that style attribute.
+    """
+    values = {}
+
+    def remove_attrs(start, end):
+        segments = []
+        last = start
+        for attr in _RE_ATTR.finditer(attrs, start, end):
+            name = attr.group(1)
+            value = attr.group(3)
+            pattern = value_patterns.get(name)
+            if pattern is not None and pattern.fullmatch(value):
+                values.setdefault(name, value)
+                segments.append(attrs[last:attr.start()])
+                last = attr.end()
+        segments.append(attrs[last:end])
+        return ''.join(segments)
+
+    style = find_style(attrs)
+    if style is None:
+        before = remove_attrs(0, len(attrs))
+        return values, None, before, ''
+
+    style_start, style_end, old_style = style
+    before = remove_attrs(0, style_start)
+    after = remove_attrs(style_end, len(attrs))
+    return values, old_style, before, after
+
+_ALIGNMENT_ATTRS = {'align': _RE_ANY_VALUE, 'width': _RE_SIZE_VALUE}
+_CELL_ATTRS = {'align': _RE_ANY_VALUE, 'valign': _RE_ANY_VALUE}
+_IMG_ATTRS = {'width': _RE_SIZE_VALUE, 'height': _RE_SIZE_VALUE, 'border': _RE_BORDER_VALUE}
 
 def convert_alignment_and_width(match):
     """Convert both align and width attributes to CSS."""
@@ -42,34 +163,29 @@ def convert_alignment_and_width(match):
     attrs = match.group(2)
     tag_end = match.group(3)
 
+    values, old_style, before, after = {}, None, attrs, ''
+    # Skip the attribute scan for the many tags with neither attribute
+    if 'align=' in attrs or 'width=' in attrs:
+        values, old_style, before, after = extract_attrs(attrs, _ALIGNMENT_ATTRS)
     styles = []
 
     # Handle align attribute
-    align_match = re.search(r'\balign=(["\'])(.*?)\1', attrs)
-    if align_match:
-        align_value = align_match.group(2)
-        styles.append(f"text-align: {align_value};")
-        # Remove align attribute
-        attrs = re.sub(r'\balign=(["\'])[^"\']*["\']', '', attrs)
+    if 'align' in values:
+        styles.append(f"text-align: {values['align']};")
 
     # Handle width attribute
-    width_match = re.search(r'\bwidth=(["\'])(\d+(?:\.\d+)?(?:%|em|px|rem|vw|vh)?)(["\'])', attrs)
-    if width_match:
-        value = width_match.group(2)
+    if 'width' in values:
+        value = values['width']
         # Add px if it's just a number
         if value.isdigit():
             value += 'px'
         styles.append(f"width: {value};")
-        # Remove width attribute
-        attrs = re.sub(r'\bwidth=(["\'])[^"\']*["\']', '', attrs)
 
     if styles:
-        # Check for existing style attribute
-        style_match = re.search(r'style=(["\'])(.*?)\1', attrs)
-        if style_match:
-            old_style = style_match.group(2)
+        # Merge with any existing style attribute
+        if old_style is not None:
             new_style = merge_styles(old_style, ' '.join(styles))
-            attrs = re.sub(r'style=(["\']).*?\1', f'style="{new_style}"', attrs)
+            attrs = f'{before}style="{new_style}"{after}'
         else:
             attrs = f' style="{" ".join(styles)}"'
 
@@ -88,12 +204,10 @@ def convert_table_attributes(match):
     styles = []
     new_attrs = []
 
-    # Extract existing style attribute if present
-    style_match = re.search(r'style=(["\'])(.*?)\1', attrs)
-    existing_style = style_match.group(2) if style_match else ""
+    existing_style = None
 
     # Process attributes
-    for attr in re.finditer(r'(\w+)=(["\'])(.*?)\2', attrs):
+    for attr in _RE_TABLE_ATTR.finditer(attrs):
         name, _, value = attr.groups()
         if name == 'cellpadding':
             styles.append(f"padding: {value}px;")
@@ -108,14 +222,15 @@ def convert_table_attributes(match):
             # summary attribute is obsolete, skip it
             continue
         elif name == 'style':
-            # Skip style attribute as we'll handle it separately
-            continue
+            # Keep the existing style to merge with the new styles
+            if existing_style is None:
+                existing_style = value
         else:
             # Keep other attributes
             new_attrs.append(f'{name}="{value}"')
 
     # Merge existing styles with new styles
-    all_styles = merge_styles(existing_style, ' '.join(styles))
+    all_styles = merge_styles(existing_style or '', ' '.join(styles))
 
     if all_styles:
         new_attrs.append(f'style="{all_styles}"')
@@ -126,324 +241,331 @@ def convert_table_attributes(match):
     else:
         return f"{tag_start}{tag_end}"
 
-def convert_to_html5(content, lang='en'):
-    """Convert HTML content to HTML5."""
-    # Remove forbidden control characters
-    content = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', content)
-
-    # Remove XML declaration and any following blank lines
-    content = re.sub(
-        r'<\?xml[^>]*\?>[\r\n]*[\n\r]*',
-        '',
-        content
-    )
+def convert_cell_attrs_to_style(match):
+    """Convert td/th align and valign attributes to CSS."""
+    tag_start = match.group(1)
+    attrs = match.group(2)
+    tag_end = match.group(3)
 
-    # First replace DOCTYPE
-    content = re.sub(
-        r'<!DOCTYPE[^>]*>',
-        '<!DOCTYPE html>',
-        content,
-        flags=re.IGNORECASE
-    )
+    values, old_style, before, after = {}, None, attrs, ''
+    # Skip the attribute scan for cells without align or valign
+    if 'align=' in attrs:
+        values, old_style, before, after = extract_attrs(attrs, _CELL_ATTRS)
+    styles = []
 
-    # Clean up html tag attributes and ensure single lang attribute
-    def clean_html_tag(match):
-        full_tag = match.group(0)
-        # Remove xmlns and xml:lang attributes
-        full_tag = re.sub(r'\s+xmlns="[^"]*"', '', full_tag)
-        full_tag = re.sub(r'\s+xml:lang="[^"]*"', '', full_tag)
-        # Remove duplicate lang attributes
-        lang_matches = re.finditer(r'\s+lang="([^"]*)"', full_tag)
-        langs = [m.group(1) for m in lang_matches]
+    # Handle align attribute
+    if 'align' in values:
+        styles.append(f"text-align: {values['align']};")
 
-        # Remove all lang attributes
-        full_tag = re.sub(r'\s+lang="[^"]*"', '', full_tag)
+    # Handle valign attribute
+    if 'valign' in values:
+        styles.append(f"vertical-align: {values['valign']};")
 
-        # Add back the appropriate lang attribute
-        if langs:
-            # Use the first lang value found if any exist
-            final_lang = langs[0]
+    if styles:
+        # Merge with any existing style attribute
+        if old_style is not None:
+            new_style = merge_styles(old_style, ' '.join(styles))
+            attrs = f'{before}style="{new_style}"{after}'
         else:
-            final_lang = lang
-
-        # Insert the lang attribute after the html tag
-        full_tag = full_tag.replace('html', f'html lang="{final_lang}"', 1)
-        return full_tag
-
-    # Clean up the html tag
-    content = re.sub(
-        r'<html[^>]*>',
-        clean_html_tag,
-        content,
-        flags=re.IGNORECASE
-    )
-
-    # Remove Content-Style-Type meta tag
-    content = re.sub(
-        r'[\s]*<meta[^>]*Content-Style-Type[^>]*/?>[\s]*\n?',
-        '',
-        content,
-        flags=re.IGNORECASE
-    )
-
-    # Replace or add UTF-8 charset meta tag
-    old_meta = re.search(
-        r'<meta[^>]+charset=[^>]*>|<meta\s+http-equiv=["\']Content-Type["\'][^>]*>',
-        content,
-        flags=re.IGNORECASE
-    )
+            attrs = f' style="{" ".join(styles)}"'
 
-    if old_meta:
-        content = content.replace(old_meta.group(0), '<meta charset="utf-8">\n')
+    # Add space after tag name if we have attributes
+    if attrs.strip():
+        return f"{tag_start} {attrs.strip()}{tag_end}"
     else:
-        content = re.sub(
-            r'(<head[^>]*>)',
-            r'\1\n    <meta charset="utf-8">',
-            content,
-            flags=re.IGNORECASE
-        )
-
-    # Remove xml:space attributes
-    content = re.sub(
-        r'\s+xml:space=["\'][^"\']*["\']',
-        '',
-        content,
-        flags=re.IGNORECASE
-    )
+        return f"{tag_start}{tag_end}"
 
-    # Update title format
-    content = re.sub(
-        r'<title>\s*The Project Gutenberg eBook of (.+), by .+\s*</title>',
-        r'<title>\1 | Project Gutenberg</title>',
-        content,
-        flags=re.IGNORECASE
-    )
+def convert_img_sizes(match):
+    """Convert width/height with units on images to CSS."""
+    full_tag = match.group(0)
 
-    # Remove type="text/css" from style tags
-    content = re.sub(
-        r'<style\s+type\s*=\s*["\']text/css["\']\s*',
-        '<style',
-        content,
-        flags=re.IGNORECASE
-    )
-    # Remove CDATA sections from style tags
-    content = re.sub(
-        r'(<style[^>]*>)\s*<!\[CDATA\[(.*?)\]\]>\s*(</style>)',
-        r'\1\2\3',
-        content,
-        flags=re.DOTALL | re.IGNORECASE
-    )
-    content = re.sub(
-        r'(<style[^>]*>)\s*/\*<!\[CDATA\[\*/\s*(.*?)\s*/\*\]\]>\*/\s*(</style>)',
-        r'\1\2\3',
-        content,
-        flags=re.DOTALL | re.IGNORECASE
-    )
+    values, old_style, before, after = {}, None, full_tag, ''
+    # Find width/height with unit values (%, em, px, etc) or plain numbers
+    if 'width=' in full_tag or 'height=' in full_tag or 'border=' in full_tag:
+        # The rewritten tag has its whitespace collapsed anyway, and doing
+        # that first lets an existing style value span lines
+        values, old_style, before, after = extract_attrs(_RE_WHITESPACE.sub(' ', full_tag), _IMG_ATTRS)
 
-    # Clean up CSS in style tags
-    for style_match in re.finditer(r'<style[^>]*>(.*?)</style>', content, re.DOTALL | re.IGNORECASE):
-        css_content = style_match.group(1)
-        cleaned_css = clean_css_comments(css_content)
-        content = content.replace(css_content, cleaned_css)
-
-    # Convert <tt> tags to span with monospace style
-    content = re.sub(
-        r'<tt([^>]*)>',
-        r'<span\1 style="font-family: monospace;">',
-        content,
-        flags=re.IGNORECASE
-    )
-    content = re.sub(
-        r'</tt>',
-        '</span>',
-        content,
-        flags=re.IGNORECASE
-    )
+    # If we found any values, move them to style
+    if values:
+        styles = []
+        # Collect CSS for the removed width/height/border attributes
+        if 'width' in values:
+            value = values['width']
+            # Add px if it's just a number
+            if value.isdigit():
+                value += 'px'
+            styles.append(f"width: {value}")
+        if 'height' in values:
+            value = values['height']
+            # Add px if it's just a number
+            if value.isdigit():
+                value += 'px'
+            styles.append(f"height: {value}")
+        if 'border' in values:
+            value = values['border']
+            if value == '0':
+                styles.append("border: none")
+            else:
+                styles.append(f"border: {value}px solid")
 
-    # Convert <big> tags to span with style
-    content = re.sub(
-        r'<big([^>]*)>',
-        r'<span style="font-size: larger"\1>',
-        content,
-        flags=re.IGNORECASE
-    )
-    content = re.sub(
-        r'</big>',
-        '</span>',
-        content,
-        flags=re.IGNORECASE
-    )
+        # Merge with any existing style attribute
+        if old_style is not None:
+            new_style = merge_styles(old_style, '; '.join(styles))
+            full_tag = f'{before}style="{new_style}"{after}'
+        else:
+            full_tag = before
 
-    # Convert <center> tags to div with style
-    content = re.sub(
-        r'<center([^>]*)>',
-        r'<div style="text-align: center"\1>',
-        content,
-        flags=re.IGNORECASE
-    )
-    content = re.sub(
-        r'</center>',
-        '</div>',
-        content,
-        flags=re.IGNORECASE
-    )
+        # Clean up the tag before adding style
+        full_tag = _RE_SELF_CLOSING_SLASH.sub('>', full_tag)  # Remove self-closing slash
+        full_tag = _RE_WHITESPACE.sub(' ', full_tag)       # Clean up spaces
+        full_tag = full_tag.rstrip('>')                # Remove closing bracket temporarily
 
-    # Handle name and id attributes in anchors
-    content = re.sub(
-        r'<a([^>]*?)\s+id\s*=\s*(["\'][^"\']*["\'])\s+name\s*=\s*\2([^>]*?)>',  # id first, then name
-        r'<a\1 id=\2\3>',
-        content,
-        flags=re.IGNORECASE
-    )
-    content = re.sub(
-        r'<a([^>]*?)\s+name\s*=\s*(["\'][^"\']*["\'])\s+id\s*=\s*\2([^>]*?)>',  # name first, then id
-        r'<a\1 id=\2\3>',
-        content,
-        flags=re.IGNORECASE
-    )
-    content = re.sub(
-        r'<a([^>]*?)\s+name\s*=\s*(["\'][^"\']*["\'])(?![^>]*?\s+id\s*=)\s*([^>]*?)>',  # only name exists
-        r'<a\1 id=\2\3>',
-        content,
-        flags=re.IGNORECASE
-    )
+        # Add a new style attribute
+        if old_style is None:
+            full_tag = f'{full_tag.strip()} style="{"; ".join(styles)}"'
 
-    # Convert width and align attributes to CSS for various elements
-    content = re.sub(
-        r'(<(?:hr|table|td|th|div|p|h[1-6]))((?:\s+[^>]*)?)(\s*>)',
-        convert_alignment_and_width,
-        content,
-        flags=re.IGNORECASE
+        full_tag = f"{full_tag}>"  # Add back closing bracket
+    else:
+        # Just clean up self-closing slash if no width/height/border found
+        full_tag = _RE_SELF_CLOSING_SLASH.sub('>', full_tag)
+
+    return full_tag
+
+def convert_anchor(match):
+    """Replace the name attribute of an anchor with an id."""
+    attrs = match.group(1)
+
+    # Find the first id and name attributes
+    found = {}
+    for attr in _RE_ANCHOR_ATTR.finditer(attrs):
+        found.setdefault(attr.group(1).lower(), attr)
+    name_match = found.get('name')
+    id_match = found.get('id')
+
+    if name_match is None:
+        return match.group(0)
+    if id_match is None:
+        # Only name exists, turn it into an id
+        attrs = f'{attrs[:name_match.start()]} id={name_match.group(2)}{attrs[name_match.end():]}'
+    elif id_match.group(3) == name_match.group(3):
+        # Both exist with the same value, drop the name
+        attrs = attrs[:name_match.start()] + attrs[name_match.end():]
+    else:
+        return match.group(0)
+    return f'<a{attrs}>'
+
+def convert_style_block(block):
+    """Clean up a <style> element and the CSS inside it."""
+    # Remove type="text/css" from the style tag
+    block = _RE_STYLE_TYPE.sub('<style', block)
+
+    # Remove CDATA sections
+    block = _RE_STYLE_CDATA.sub(r'\1\2\3', block)
+    block = _RE_STYLE_CDATA_COMMENTED.sub(r'\1\2\3', block)
+
+    # Clean up the CSS itself
+    return _RE_STYLE_BLOCK.sub(
+        lambda m: m.group(1) + clean_css_comments(m.group(2)) + m.group(3),
+        block
     )
 
-    # Convert table attributes to CSS
-    content = re.sub(
-        r'(<table)((?:\s+[^>]*)?)(\s*>)',
-        convert_table_attributes,
-        content,
-        flags=re.IGNORECASE
-    )
+# Conversions applied, in order, to each opening tag of the given name
+_BLOCK_CONVERSION = (_RE_BLOCK_TAG, convert_alignment_and_width)
+_TAG_CONVERSIONS = {
+    'tt': ((_RE_TT_OPEN, r'<span\1 style="font-family: monospace;">'),),
+    'big': ((_RE_BIG_OPEN, r'<span style="font-size: larger"\1>'),),
+    # The resulting div still needs its align/width attributes converted
+    'center': ((_RE_CENTER_OPEN, r'<div style="text-align: center"\1>'), _BLOCK_CONVERSION),
+    'a': ((_RE_ANCHOR, convert_anchor),),
+    'table': (_BLOCK_CONVERSION, (_RE_TABLE_TAG, convert_table_attributes)),
+    'td': (_BLOCK_CONVERSION, (_RE_CELL_TAG, convert_cell_attrs_to_style)),
+    'th': (_BLOCK_CONVERSION, (_RE_CELL_TAG, convert_cell_attrs_to_style)),
+    'img': ((_RE_IMG_TAG, convert_img_sizes),),
+}
+_TAG_CONVERSIONS.update(dict.fromkeys(
+    ('hr', 'div', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'), (_BLOCK_CONVERSION,)
+))
+
+_CLOSING_TAGS = {
+    'tt': '</span>',
+    'big': '</span>',
+    'center': '</div>',
+}
 
-    def convert_cell_attrs_to_style(match):
-        tag_start = match.group(1)
-        attrs = match.group(2)
-        tag_end = match.group(3)
+def convert_to_html5(content, lang='en'):
+    """Convert HTML content to HTML5."""
+    # Remove forbidden control characters.  str.translate is only fast on
+    # ASCII strings, so other documents keep using the regex.
+    if content.isascii():
+        content = content.translate(_CTRL_TRANS)
+    else:
+        content = _RE_CTRL.sub('', content)
 
-        styles = []
+    # Find tokens in a lowercased copy; its offsets only line up with the
+    # original when lowercasing keeps every character the same length
+    lower = content.lower()
+    scan = lower
+    token_pattern = _RE_TOKEN
+    if len(lower) != len(content):
+        scan = content
+        token_pattern = _RE_TOKEN_IGNORECASE
 
-        # Handle align attribute
-        align_match = re.search(r'\balign=(["\'])(.*?)\1', attrs)
-        if align_match:
-            align_value = align_match.group(2)
-            styles.append(f"text-align: {align_value};")
-            # Remove align attribute
-            attrs = re.sub(r'\balign=(["\']).*?\1', '', attrs)
-
-        # Handle valign attribute
-        valign_match = re.search(r'\bvalign=(["\'])(.*?)\1', attrs)
-        if valign_match:
-            valign_value = valign_match.group(2)
-            styles.append(f"vertical-align: {valign_value};")
-            # Remove valign attribute
-            attrs = re.sub(r'\bvalign=(["\']).*?\1', '', attrs)
-
-        if styles:
-            # Check for existing style attribute
-            style_match = re.search(r'style=(["\'])(.*?)\1', attrs)
-            if style_match:
-                old_style = style_match.group(2)
-                new_style = merge_styles(old_style, ' '.join(styles))
-                attrs = re.sub(r'style=(["\']).*?\1', f'style="{new_style}"', attrs)
-            else:
-                attrs = f' style="{" ".join(styles)}"'
+    # Documents without any legacy construct are returned untouched
+    first = token_pattern.search(scan)
+    if first is None:
+        return content
 
-        # Add space after tag name if we have attributes
-        if attrs.strip():
-            return f"{tag_start} {attrs.strip()}{tag_end}"
-        else:
-            return f"{tag_start}{tag_end}"
-
-    # Convert td/th align and valign attributes to CSS
-    content = re.sub(
-        r'(<(?:td|th))((?:\s+[^>]*)?)(\s*>)',
-        convert_cell_attrs_to_style,
-        content,
-        flags=re.IGNORECASE
-    )
+    # Skip the xml:space removal on documents that have none
+    has_xml_space = 'xml:space' in lower
 
-    # Convert width/height with units on images to CSS
-    def convert_img_sizes(match):
+    # Clean up html tag attributes and ensure single lang attribute
+    def clean_html_tag(match):
         full_tag = match.group(0)
+        # Remove xmlns, xml:lang and all (possibly duplicate) lang
+        # attributes in one pass, collecting the lang values
+        langs = []
+        segments = []
+        last = 0
+        for attr in _RE_HTML_ATTRS.finditer(full_tag):
+            if attr.group(1) == 'lang':
+                langs.append(attr.group(2))
+            segments.append(full_tag[last:attr.start()])
+            last = attr.end()
+        segments.append(full_tag[last:])
+        full_tag = ''.join(segments)
 
-        # Find width/height with unit values (%, em, px, etc) or plain numbers
-        width_match = re.search(r'\bwidth=(["\'])(\d+(?:\.\d+)?(?:%|em|px|rem|vw|vh)?)(["\'])', full_tag)
-        height_match = re.search(r'\bheight=(["\'])(\d+(?:\.\d+)?(?:%|em|px|rem|vw|vh)?)(["\'])', full_tag)
-        border_match = re.search(r'\bborder=(["\'])(\d+)(["\'])', full_tag)
-
-        # If we found any values, move them to style
-        if width_match or height_match or border_match:
-            styles = []
-            # Remove width/height/border attributes and collect CSS
-            if width_match:
-                value = width_match.group(2)
-                # Add px if it's just a number
-                if value.isdigit():
-                    value += 'px'
-                full_tag = re.sub(r'\bwidth=(["\'])[^"\']*["\']', '', full_tag)
-                styles.append(f"width: {value}")
-            if height_match:
-                value = height_match.group(2)
-                # Add px if it's just a number
-                if value.isdigit():
-                    value += 'px'
-                full_tag = re.sub(r'\bheight=(["\'])[^"\']*["\']', '', full_tag)
-                styles.append(f"height: {value}")
-            if border_match:
-                value = border_match.group(2)
-                full_tag = re.sub(r'\bborder=(["\'])[^"\']*["\']', '', full_tag)
-                if value == '0':
-                    styles.append("border: none")
-                else:
-                    styles.append(f"border: {value}px solid")
-
-            # Clean up the tag before adding style
-            full_tag = re.sub(r'\s*/\s*>', '>', full_tag)  # Remove self-closing slash
-            full_tag = re.sub(r'\s+', ' ', full_tag)       # Clean up spaces
-            full_tag = full_tag.rstrip('>')                # Remove closing bracket temporarily
-
-            # Add or merge style attribute
-            style_match = re.search(r'style=(["\'])(.*?)\1', full_tag)
-            if style_match:
-                old_style = style_match.group(2)
-                new_style = merge_styles(old_style, '; '.join(styles))
-                full_tag = re.sub(r'style=(["\']).*?\1', f'style="{new_style}"', full_tag)
-            else:
-                full_tag = f'{full_tag.strip()} style="{"; ".join(styles)}"'
-
-            full_tag = f"{full_tag}>"  # Add back closing bracket
+        # Add back the appropriate lang attribute
+        if langs:
+            # Use the first lang value found if any exist
+            final_lang = langs[0]
         else:
-            # Just clean up self-closing slash if no width/height/border found
-            full_tag = re.sub(r'\s*/\s*>', '>', full_tag)
+            final_lang = lang
 
+        # Insert the lang attribute after the html tag
+        full_tag = full_tag.replace('html', f'html lang="{final_lang}"', 1)
         return full_tag
 
-    content = re.sub(
-        r'<img[^>]+>',
-        convert_img_sizes,
-        content,
-        flags=re.IGNORECASE
+    # Existing charset meta tag to replace, if any; otherwise one is added
+    # after the head tag
+    old_meta = _RE_META_CHARSET.search(content)
+    old_meta = old_meta.group(0) if old_meta else None
+
+    def convert_token(match, token):
+        kind = match.lastgroup
+        if kind == 'doctype':
+            return '<!DOCTYPE html>'
+        if kind == 'xml_decl':
+            # Remove XML declaration
+            return ''
+        if kind == 'slash':
+            # Convert self-closing tags
+            return '>'
+
+        if kind == 'tag':
+            name = match.group('tag').lower()
+            if name == 'html':
+                token = _RE_HTML_TAG.sub(clean_html_tag, token)
+            elif name == 'meta':
+                if token == old_meta:
+                    token = '<meta charset="utf-8">\n'
+            elif name == 'head':
+                if old_meta is None:
+                    token += '\n    <meta charset="utf-8">'
+            if has_xml_space:
+                token = _RE_XML_SPACE.sub('', token)
+            conversions = _TAG_CONVERSIONS.get(name, ())
+            if name == 'a' and 'name' not in token.lower():
+                # Only anchors with a name attribute are rewritten
+                conversions = ()
+            for pattern, repl in conversions:
+                token = pattern.sub(repl, token)
+        elif kind == 'close':
+            # Unicode case folding can match names that aren't keys here
+            token = _CLOSING_TAGS.get(match.group('close').lower(), token)
+        elif kind == 'style':
+            if has_xml_space:
+                token = _RE_XML_SPACE.sub('', token)
+            token = convert_style_block(token)
+        elif kind == 'title':
+            # Update title format
+            token = _RE_TITLE.sub(r'<title>\1 | Project Gutenberg</title>', token)
+
+        # Convert self-closing tags
+        return token.replace('/>', '>')
+
+    # Rewrite every legacy construct in a single scan of the document
+    out = []
+    last = 0
+    for match in token_pattern.finditer(scan, first.start()):
+        start, end = match.span()
+        text = content[last:start]
+        token = content[start:end]
+        last = end
+        kind = match.lastgroup
+        if kind == 'style_meta':
+            # Remove Content-Style-Type meta tag and surrounding whitespace
+            out.append(text.rstrip())
+        elif kind == 'xml_space':
+            # Remove xml:space attributes along with the preceding whitespace
+            stripped = text.rstrip()
+            if stripped == text:
+                out.append(text + token)
+            else:
+                out.append(stripped)
+        else:
+            out.append(text)
+            out.append(convert_token(match, token))
+    out.append(content[last:])
+    return ''.join(out)
+
+def get_cache_path(raw, lang):
+    """Return the cache file for converting raw with lang.
+
+    The key covers this script's own source, so any change to the
+    conversion invalidates earlier results.  Entries live in a per-user
+    directory that other users can't write to.
+    """
+    key = hashlib.sha256(raw)
+    with open(os.path.abspath(__file__), 'rb') as f:
+        key.update(hashlib.sha256(f.read()).digest())
+    key.update(f'\0{lang}'.encode('utf-8'))
+    cache_dir = os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'htmlto5'
     )
-
-    # Convert self-closing tags
-    content = re.sub(r'/>', '>', content)
-
-    return content
+    return os.path.join(cache_dir, f'{key.hexdigest()}.htm')
+
+def store_cache(output_path, cache_path):
+    """Copy output_path into the cache without exposing a partial entry.
+
+    Entries that haven't been used for _CACHE_MAX_AGE seconds are removed
+    first, so the cache doesn't keep every converted file forever.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    expired = time.time() - _CACHE_MAX_AGE
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            try:
+                if entry.name.endswith('.htm') and entry.stat().st_mtime < expired:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp, open(output_path, 'rb') as f:
+            shutil.copyfileobj(f, tmp)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Convert HTML files to HTML5')
     parser.add_argument('input_file', help='Input HTML file to convert')
     parser.add_argument('--lang', default='en', help='Language code for html tag (default: en)')
+    parser.add_argument('--no-cache', action='store_true', help="Don't read or write the conversion cache")
     parser.add_argument('--version', action='version', version=f'%(prog)s {VERSION}')
 
     args = parser.parse_args()
@@ -451,22 +573,56 @@ def main():
     print_version()
 
     try:
-        # Try UTF-8 first
-        try:
-            with open(args.input_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # If UTF-8 fails, try reading as iso-8859-1 and encode to UTF-8
-            with open(args.input_file, 'r', encoding='iso-8859-1') as f:
-                content = f.read()
+        output_path = os.path.join(os.path.dirname(args.input_file), 'output.htm')
+
+        with open(args.input_file, 'rb') as f:
+            # Map regular files instead of copying them into memory; mmap
+            # can't map an empty file or a pipe, so read those instead
+            st = os.fstat(f.fileno())
+            mapped = stat.S_ISREG(st.st_mode) and st.st_size > 0
+            raw = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if mapped else f.read()
+            try:
+                # Reuse the result of an earlier conversion of identical
+                # input; like storing it, this is best effort
+                cache_path = None
+                if not args.no_cache:
+                    try:
+                        cache_path = get_cache_path(raw, args.lang)
+                        if os.path.isfile(cache_path):
+                            shutil.copyfile(cache_path, output_path)
+                            # Mark the entry as used so it isn't pruned
+                            os.utime(cache_path)
+                            return
+                    except OSError:
+                        pass
+
+                # Try UTF-8 first
+                try:
+                    content = str(raw, 'utf-8')
+                except UnicodeDecodeError:
+                    # If UTF-8 fails, try reading as iso-8859-1 and encode to UTF-8
+                    content = str(raw, 'iso-8859-1')
+            finally:
+                if mapped:
+                    raw.close()
+
+        # Translate newlines the way reading in text mode does
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
 
         # Convert content
         new_content = convert_to_html5(content, lang=args.lang)
 
         # Always write as UTF-8
-        with open(os.path.join(os.path.dirname(args.input_file), 'output.htm'), 'w', encoding='utf-8') as f:
+        with open(output_path, 'w', encoding='utf-8') as f:
             f.write(new_content)
 
+        # Caching is best effort, a failure here must not fail the conversion
+        if cache_path is not None:
+            try:
+                store_cache(output_path, cache_path)
+            except OSError:
+                pass
+
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)